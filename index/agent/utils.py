@@ -1,10 +1,12 @@
+import asyncio
 import base64
 import enum
+import functools
 import importlib.resources
 import json
 import logging
 import re
-from typing import Any, Dict, Type
+from typing import Any, Dict, Iterator, Optional, Type
 
 from pydantic import BaseModel, ValidationError
 
@@ -14,6 +16,14 @@ from index.llm.llm import BaseLLMProvider, Message
 
 logger = logging.getLogger(__name__)
 
+# Patterns used to extract the agent's JSON output, compiled once at import
+_OUTPUT_TAG_PATTERN = re.compile(r"<output(?:[^>]*)>(.*?)</output(?:[^>]*)>", re.DOTALL)
+_OPEN_TAG_PATTERN = re.compile(r"<output(?:[^>]*)>")
+_CLOSING_TAG_PATTERN = re.compile(r"</output(?:[^>]*)>")
+_CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F]')
+# Responses longer than this are scanned in a worker thread so the event loop stays responsive
+_OFFLOAD_THRESHOLD = 32 * 1024
+
 def load_demo_image_as_b64(image_name: str) -> str:
     """
     Load an image from the demo_images directory and return it as a base64 string.
@@ -98,6 +108,149 @@ def pydantic_to_custom_jtd(model_class: Type[BaseModel]) -> Dict[str, Any]:
     return process_model(model_class)
 
 
+def _find_balanced_object(text: str, start: int) -> int:
+    """
+    Find the end of the balanced `{...}` that opens at text[start].
+
+    Tracks brace depth outside of string literals (honoring escapes),
+    so braces inside strings don't affect the result.
+
+    Returns:
+        The index just past the closing brace, or -1 if the braces are unbalanced
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+
+    return -1
+
+
+def _iter_balanced_objects(text: str) -> Iterator[str]:
+    """
+    Yield the balanced `{...}` spans of a string, from left to right.
+
+    A brace that never closes, e.g. one in prose, is skipped and the scan
+    resumes at the next one. After a span is yielded the scan resumes past its end.
+    """
+    start = text.find("{")
+    while start != -1:
+        end = _find_balanced_object(text, start)
+        if end == -1:
+            start = text.find("{", start + 1)
+            continue
+
+        yield text[start:end]
+        start = text.find("{", end)
+
+
+def find_first_json_object(text: str) -> Optional[str]:
+    """
+    Find the first JSON object in a string.
+
+    Balanced `{...}` spans that aren't valid JSON, such as braces in the
+    surrounding prose, are skipped, so the scan continues after them.
+
+    Args:
+        text: Text that may contain a JSON object
+
+    Returns:
+        The first balanced `{...}` substring that parses as JSON, or None if there is none
+    """
+    for candidate in _iter_balanced_objects(text):
+        try:
+            json.loads(candidate)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+
+    return None
+
+
+def _find_agent_output_object(text: str) -> Optional[str]:
+    """
+    Find the first JSON object in a string that looks like agent output, i.e. has an `action` key.
+
+    JSON fragments in the surrounding prose, such as action params, are skipped.
+    Control characters in strings are tolerated here, since validate_json removes them later.
+    """
+    for candidate in _iter_balanced_objects(text):
+        try:
+            parsed = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict) and "action" in parsed:
+            return candidate
+
+    return None
+
+
+def extract_json_candidate(raw_llm_response_content: str) -> str:
+    """
+    Extract the JSON string to validate from raw LLM output.
+
+    The result only depends on the input, so it is memoized: retried steps and
+    repeated model outputs skip the regex and brace scanning. Responses longer than
+    _OFFLOAD_THRESHOLD are not memoized, so the cache never holds on to large outputs.
+
+    Args:
+        raw_llm_response_content: The raw string content from the LLM response.
+
+    Returns:
+        The content of the <output> tags if present, otherwise the first JSON object with
+        an `action` key found after removing stray tags and markdown code fences. If there is
+        no such object, the whole cleaned text is returned so that the fix-up step sees all of it.
+    """
+    if len(raw_llm_response_content) > _OFFLOAD_THRESHOLD:
+        return _extract_json_candidate(raw_llm_response_content)
+    return _extract_json_candidate_cached(raw_llm_response_content)
+
+
+def _extract_json_candidate(raw_llm_response_content: str) -> str:
+    """Uncached implementation of extract_json_candidate"""
+    match = _OUTPUT_TAG_PATTERN.search(raw_llm_response_content)
+    if match:
+        return match.group(1).strip()
+
+    # if we couldn't find the <output> tags, it most likely means the <output*> tag is not present in the response
+    # remove closing and opening tags just in case
+    json_str_no_closing = _CLOSING_TAG_PATTERN.sub("", raw_llm_response_content).strip()
+    json_str_no_tags = _OPEN_TAG_PATTERN.sub("", json_str_no_closing).strip()
+    # Also remove potential markdown code blocks if not already handled by regex
+    json_str = json_str_no_tags.replace("```json", "").replace("```", "").strip()
+    # Drop any prose the model wrote around the JSON object
+    return _find_agent_output_object(json_str) or json_str
+
+
+_extract_json_candidate_cached = functools.lru_cache(maxsize=256)(_extract_json_candidate)
+
+
+def _strip_code_fences(text: str) -> str:
+    """Remove a markdown ```json code fence wrapping the text, if any"""
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
 async def generate_proper_json(llm: BaseLLMProvider, json_str: str) -> str:
 
     prompt = f"""The following JSON string is malformed or has issues. Please correct it while preserving the original structure and content as much as possible.
@@ -112,12 +265,7 @@ Problematic JSON string:
     ]
 
     response = await llm.call(input_messages)
-    corrected_json_str = response.content.strip()
-    if corrected_json_str.startswith("```json"):
-        corrected_json_str = corrected_json_str[7:]
-    if corrected_json_str.endswith("```"):
-        corrected_json_str = corrected_json_str[:-3]
-    return corrected_json_str.strip()
+    return _strip_code_fences(response.content.strip())
 
 
 async def validate_json(raw_llm_response_content: str, llm: BaseLLMProvider, max_retries: int = 3) -> AgentLLMOutput:
@@ -137,21 +285,10 @@ async def validate_json(raw_llm_response_content: str, llm: BaseLLMProvider, max
         ValueError: If the JSON string cannot be parsed or validated after all retries.
     """
     # 1. Regex extraction from raw_llm_response_content
-    pattern = r"<output(?:[^>]*)>(.*?)</output(?:[^>]*)>"
-    match = re.search(pattern, raw_llm_response_content, re.DOTALL)
-    
-    current_json_str = ""
-    if not match:
-        # if we couldn't find the <output> tags, it most likely means the <output*> tag is not present in the response
-        # remove closing and opening tags just in case
-        closing_tag_pattern = r"</output(?:[^>]*)>"
-        json_str_no_closing = re.sub(closing_tag_pattern, "", raw_llm_response_content).strip()
-        open_tag_pattern = r"<output(?:[^>]*)>"
-        json_str_no_tags = re.sub(open_tag_pattern, "", json_str_no_closing).strip()
-        # Also remove potential markdown code blocks if not already handled by regex
-        current_json_str = json_str_no_tags.replace("```json", "").replace("```", "").strip()
+    if len(raw_llm_response_content) > _OFFLOAD_THRESHOLD:
+        current_json_str = await asyncio.to_thread(extract_json_candidate, raw_llm_response_content)
     else:
-        current_json_str = match.group(1).strip()
+        current_json_str = extract_json_candidate(raw_llm_response_content)
 
     last_exception = None
 
@@ -161,12 +298,7 @@ async def validate_json(raw_llm_response_content: str, llm: BaseLLMProvider, max
         # Stage 1: Try to parse the current_json_str as is
         try:
             # Remove potential markdown that might have been added by LLM fix
-            temp_json_str = current_json_str
-            if temp_json_str.startswith("```json"):
-                temp_json_str = temp_json_str[7:]
-            if temp_json_str.endswith("```"):
-                temp_json_str = temp_json_str[:-3]
-            temp_json_str = temp_json_str.strip()
+            temp_json_str = _strip_code_fences(current_json_str)
 
             logger.debug(f"Attempting to parse JSON on attempt {attempt + 1}. Raw JSON: '{temp_json_str}'")
             output = AgentLLMOutput.model_validate_json(temp_json_str)
@@ -182,13 +314,7 @@ async def validate_json(raw_llm_response_content: str, llm: BaseLLMProvider, max
                 # Removed explicit replacement of \n, \r, \t - rely on JSON parser
                 # json_str_cleaned = json_str_cleaned.replace('\\\\n', '\n').replace('\\\\r', '\r').replace('\\\\t', '\t')
                 # Keep control character removal
-                json_str_cleaned = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', json_str_cleaned)
-                
-                if json_str_cleaned.startswith("```json"):
-                    json_str_cleaned = json_str_cleaned[7:]
-                if json_str_cleaned.endswith("```"):
-                    json_str_cleaned = json_str_cleaned[:-3]
-                json_str_cleaned = json_str_cleaned.strip()
+                json_str_cleaned = _strip_code_fences(_CONTROL_CHARS_PATTERN.sub('', json_str_cleaned))
 
                 logger.debug(f"Attempting to parse cleaned JSON on attempt {attempt + 1}. Cleaned JSON: '{json_str_cleaned[:250]}...'")
                 output = AgentLLMOutput.model_validate_json(json_str_cleaned)
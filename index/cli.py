@@ -243,6 +243,11 @@ class AgentSession:
             self.chrome_process.terminate()
             self.chrome_process = None
 
+        # Close the LLM client, e.g. the HTTP session of the Ollama provider
+        aclose = getattr(self.llm, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
 
 class AgentUI(App):
     """Textual-based UI for interacting with the agent"""
@@ -750,7 +755,8 @@ async def _interactive_loop(initial_prompt: str = None, use_local_chrome: bool =
             
     except KeyboardInterrupt:
         console.print("\n[yellow]Exiting interactive mode...[/]")
-        # Close the browser before exiting
+    finally:
+        # Close the browser and the LLM client before exiting
         await session.close()
 
 
@@ -1,10 +1,10 @@
 import sys
-from typing_extensions import TypedDict as ExtTypedDict
 
-# Monkey patch typing.TypedDict to use typing_extensions.TypedDict
+# Monkey patch typing.TypedDict to use typing_extensions.TypedDict on Python < 3.12,
+# where typing.TypedDict is not accepted by pydantic. Newer versions keep the stdlib one.
 if sys.version_info < (3, 12):
     import typing
-    typing.TypedDict = ExtTypedDict
-    
-    # Also patch the module to ensure imports work correctly
-    sys.modules['typing'].TypedDict = ExtTypedDict
+
+    from typing_extensions import TypedDict as _TypedDict
+
+    typing.TypedDict = _TypedDict
@@ -0,0 +1,51 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from index.llm.llm import LLMResponse
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of LLM responses with a per-entry time to live.
+
+    The interface is async so that an external store (e.g. Redis) can be
+    swapped in without changing the providers that use it.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, LLMResponse]] = OrderedDict()
+
+    @staticmethod
+    def make_key_from_body(body: bytes) -> str:
+        """Build a cache key from a serialized request body"""
+        return hashlib.blake2b(body, digest_size=32).hexdigest()
+
+    async def get(self, key: str) -> Optional[LLMResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return response
+
+    async def set(self, key: str, response: LLMResponse) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,311 @@
+import asyncio
+import contextlib
+import importlib.util
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, Mapping, Optional, Protocol, Union
+
+import aiohttp
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional, faster drop-in for the json module
+    orjson = None
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize obj to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Deserialize JSON bytes or str, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_serialize(obj: Any) -> str:
+    """JSON serializer for aiohttp sessions, which expect a str"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+class HTTPError(Exception):
+    """Base class for errors raised by HTTP backends"""
+
+
+class HTTPConnectionError(HTTPError):
+    """The connection could not be established or was dropped by the server"""
+
+
+class HTTPTimeoutError(HTTPError):
+    """The request did not complete within its timeout"""
+
+
+class HTTPStatusError(HTTPError):
+    """The server answered with a non-200 status code"""
+
+    # Prefix of the error message, overridden by API-specific subclasses
+    message_prefix = "API error"
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"{self.message_prefix}: {status} - {text}")
+        self.status = status
+        self.text = text
+
+
+@dataclass
+class HTTPResponse:
+    """A fully read HTTP response"""
+    content_type: str
+    body: bytes
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a stream of raw byte chunks into lines, without the trailing newline.
+
+    Unlike aiohttp's line reader this has no limit on line length, and it
+    scans each chunk once instead of paying per-line buffering overhead.
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+
+    # The last line may not be newline-terminated
+    if buffer:
+        yield bytes(buffer)
+
+
+class HTTPBackend(Protocol):
+    """
+    Minimal async HTTP client interface used by providers that call plain HTTP APIs.
+
+    Backends own their connection pool and only raise HTTPError subclasses:
+    HTTPConnectionError, HTTPTimeoutError, HTTPStatusError, or HTTPError itself for any
+    other client failure, so that callers can handle errors regardless of the client library.
+    Providers should send all requests through their backend rather than opening
+    ad-hoc sessions, so that connections are pooled and JSON goes through orjson.
+    """
+
+    async def connect(self) -> None:
+        """Open the underlying client; calling it again is a no-op"""
+        ...
+
+    async def aclose(self) -> None:
+        """Close the underlying client and its connections"""
+        ...
+
+    async def post(self, url: str, data: bytes, headers: Mapping[str, str]) -> HTTPResponse:
+        """POST data to url and read back the whole response"""
+        ...
+
+    def stream(self, url: str, data: bytes, headers: Mapping[str, str]) -> AsyncIterator[bytes]:
+        """POST data to url and yield the response body line by line (without newlines) as it arrives"""
+        ...
+
+
+class AiohttpBackend:
+    """HTTP backend on a single aiohttp session with a keep-alive connection pool"""
+
+    # Streams can go quiet for a long time between chunks, so they don't time out idle reads
+    _STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_read=None)
+
+    def __init__(
+        self,
+        timeout: Optional[float] = 600,
+        session: Optional[aiohttp.ClientSession] = None,
+        limit: int = 100,
+        limit_per_host: int = 64,
+    ):
+        """
+        Args:
+            timeout: Total timeout of a request in seconds
+            session: An existing session to share with the rest of the application.
+                It is used as is and left open by aclose(), since the caller owns it.
+            limit: Maximum number of open connections in the pool
+            limit_per_host: Maximum number of open connections to a single host
+        """
+        self.timeout = timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session = session
+        self._owns_session = session is None
+        # Event loop the owned session was created on; it can't be used from any other
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed:
+            if not self._owns_session or self._loop is loop:
+                return
+            # The session was opened on another event loop, e.g. by an earlier asyncio.run().
+            # Its connections can't be used or closed from this loop, so start over
+            self._session = None
+        if not self._owns_session:
+            raise HTTPError("The shared aiohttp session passed to AiohttpBackend is closed")
+
+        self._loop = loop
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                use_dns_cache=True,
+                ttl_dns_cache=300,
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            # Keeps `json=` requests on the fast serializer too
+            json_serialize=_json_serialize,
+        )
+
+    async def aclose(self) -> None:
+        if self._session is not None and self._owns_session:
+            if self._loop is asyncio.get_running_loop():
+                await self._session.close()
+            self._session = None
+
+    async def post(self, url: str, data: bytes, headers: Mapping[str, str]) -> HTTPResponse:
+        await self.connect()
+
+        with self._translate_errors():
+            async with self._session.post(url, data=data, headers=headers) as response:
+                await self._raise_for_status(response)
+                return HTTPResponse(
+                    content_type=response.headers.get("Content-Type", ""),
+                    body=await response.read(),
+                )
+
+    async def stream(self, url: str, data: bytes, headers: Mapping[str, str]) -> AsyncIterator[bytes]:
+        await self.connect()
+
+        with self._translate_errors():
+            async with self._session.post(url, data=data, headers=headers, timeout=self._STREAM_TIMEOUT) as response:
+                await self._raise_for_status(response)
+                async for line in _iter_lines(response.content.iter_any()):
+                    yield line
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _translate_errors() -> Iterator[None]:
+        """Re-raise aiohttp errors as the matching HTTPError"""
+        try:
+            yield
+        # Checked first, since aiohttp's ServerTimeoutError is also a connection error
+        except asyncio.TimeoutError as e:
+            raise HTTPTimeoutError(str(e) or "Request timed out") from e
+        except aiohttp.ClientConnectionError as e:
+            raise HTTPConnectionError(str(e)) from e
+        except aiohttp.ClientError as e:
+            raise HTTPError(str(e)) from e
+
+    @staticmethod
+    async def _raise_for_status(response: aiohttp.ClientResponse) -> None:
+        if response.status != 200:
+            raise HTTPStatusError(response.status, await response.text())
+
+
+class HttpxBackend:
+    """
+    HTTP backend on a single httpx.AsyncClient.
+
+    Requires the `httpx` package, plus `h2` for HTTP/2. HTTP/2 lets concurrent
+    requests share one connection, once the server supports it. httpx only
+    negotiates it over TLS, so plain http:// servers are still reached over HTTP/1.1.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = 600,
+        http2: Optional[bool] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 64,
+    ):
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("HttpxBackend requires httpx, install it with `pip install httpx`") from e
+
+        if http2 is None:
+            # Use HTTP/2 whenever its optional dependency is installed
+            http2 = importlib.util.find_spec("h2") is not None
+
+        self._httpx = httpx
+        self.timeout = timeout
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._client = None
+        # Event loop the client was created on; its connection pool can't be used from any other
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def connect(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._client is not None and not self._client.is_closed and self._loop is loop:
+            return
+
+        self._loop = loop
+        self._client = self._httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=self._httpx.Timeout(self.timeout),
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._client.aclose()
+            self._client = None
+
+    async def post(self, url: str, data: bytes, headers: Mapping[str, str]) -> HTTPResponse:
+        await self.connect()
+
+        with self._translate_errors():
+            response = await self._client.post(url, content=data, headers=headers)
+
+        if response.status_code != 200:
+            raise HTTPStatusError(response.status_code, response.text)
+
+        return HTTPResponse(
+            content_type=response.headers.get("Content-Type", ""),
+            body=response.content,
+        )
+
+    async def stream(self, url: str, data: bytes, headers: Mapping[str, str]) -> AsyncIterator[bytes]:
+        await self.connect()
+
+        # Streams can go quiet for a long time between chunks, so they don't time out idle reads
+        timeout = self._httpx.Timeout(self.timeout, read=None)
+
+        with self._translate_errors():
+            async with self._client.stream("POST", url, content=data, headers=headers, timeout=timeout) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise HTTPStatusError(response.status_code, response.text)
+                async for line in _iter_lines(response.aiter_bytes()):
+                    yield line
+
+    @contextlib.contextmanager
+    def _translate_errors(self) -> Iterator[None]:
+        """Re-raise httpx errors as the matching HTTPError"""
+        httpx = self._httpx
+        try:
+            yield
+        # Checked first, since httpx's ConnectTimeout is a timeout rather than a connection failure
+        except httpx.TimeoutException as e:
+            raise HTTPTimeoutError(str(e) or "Request timed out") from e
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError) as e:
+            raise HTTPConnectionError(str(e)) from e
+        except httpx.HTTPError as e:
+            raise HTTPError(str(e)) from e
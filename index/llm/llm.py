@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
+from functools import singledispatch
 from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel
@@ -37,6 +38,35 @@ class ThinkingBlock(MessageContent):
     signature: str = ""
     type: str = "thinking"
 
+_OLLAMA_ROLES = frozenset({"system", "user", "assistant"})
+
+
+@singledispatch
+def _extract_text(content: Any) -> str:
+    """Return the text of message content; blocks without text (e.g. images) yield an empty string"""
+    return getattr(content, "text", "")
+
+
+@_extract_text.register
+def _(content: str) -> str:
+    return content
+
+
+@_extract_text.register
+def _(content: TextContent) -> str:
+    return content.text
+
+
+@_extract_text.register
+def _(content: list) -> str:
+    return "".join(_extract_text(block) for block in content)
+
+
+@_extract_text.register
+def _(content: dict) -> str:
+    return content.get("text", "")
+
+
 @dataclass
 class Message:
     """A message in a conversation"""
@@ -154,6 +184,27 @@ class Message:
             "parts": parts
         }
     
+    def to_ollama_format(self) -> Dict:
+        """Convert to Ollama message format (text content only)"""
+        # Ollama only knows system/user/assistant roles, default to user for other roles
+        role = self.role if self.role in _OLLAMA_ROLES else "user"
+
+        # Fast path for plain text, which is what nearly all messages hold
+        content = self.content
+        if type(content) is str:
+            text = content
+        elif type(content) is list and len(content) == 1 and type(content[0]) is TextContent:
+            text = content[0].text
+        elif type(content) is list and all(type(block) is TextContent for block in content):
+            text = "".join([block.text for block in content])
+        else:
+            text = _extract_text(content)
+
+        return {
+            "role": role,
+            "content": text
+        }
+    
     def remove_cache_control(self):
         if isinstance(self.content, list):
             for content_block in self.content:
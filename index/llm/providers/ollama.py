@@ -1,27 +1,157 @@
-import aiohttp
-import json
-from typing import Any, Dict, List, Optional, Union
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
-from index.llm.llm import BaseLLMProvider, LLMResponse, Message, ThinkingBlock
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from index.llm.cache import ResponseCache
+from index.llm.http import (
+    AiohttpBackend,
+    HTTPBackend,
+    HTTPConnectionError,
+    HTTPStatusError,
+    json_dumps,
+    json_loads,
+)
+from index.llm.llm import BaseLLMProvider, LLMResponse, Message
+
+
+def _pin_loopback(url: str) -> str:
+    """
+    Rewrite a `localhost` URL to 127.0.0.1.
+    
+    This skips the getaddrinfo lookup on connect, and the IPv6 (::1) attempt
+    that precedes the IPv4 fallback when Ollama only listens on 127.0.0.1.
+    """
+    parts = urlsplit(url)
+    # Keep the hostname for https, where it is needed to verify the certificate
+    if parts.scheme != "http" or parts.hostname != "localhost":
+        return url
+
+    netloc = "127.0.0.1" if parts.port is None else f"127.0.0.1:{parts.port}"
+    if parts.username is not None or parts.password is not None:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+class OllamaAPIError(HTTPStatusError):
+    """The Ollama API answered with an error"""
+
+    message_prefix = "Ollama API error"
+
+
+def _is_retryable_error(error: BaseException) -> bool:
+    """Whether a failed request should be retried: dropped connections, or the server being busy"""
+    if isinstance(error, HTTPConnectionError):
+        return True
+    return isinstance(error, HTTPStatusError) and error.status in (429, 503)
 
 
 class OllamaProvider(BaseLLMProvider):
+    # Built once and shared by every request
+    _JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
     def __init__(
         self,
         model: str = "llama3.2",
         base_url: str = "http://localhost:11434/api",
         enable_thinking: bool = False,
+        timeout: Optional[float] = 600,
+        response_cache: Optional[ResponseCache] = None,
+        backend: Optional[HTTPBackend] = None,
+        max_concurrency: Optional[int] = None,
         **kwargs
     ):
+        """
+        Args:
+            model: Name of the Ollama model
+            base_url: Base URL of the Ollama API
+            enable_thinking: Whether to enable thinking
+            timeout: Total timeout of a request in seconds
+            response_cache: Cache of deterministic responses, a private in-memory one by default
+            backend: HTTP backend used to call the API, an aiohttp one by default
+            max_concurrency: Maximum number of requests in flight to the server.
+                Match it to the server's OLLAMA_NUM_PARALLEL; extra requests would only
+                queue inside Ollama. Defaults to the OLLAMA_MAX_CONCURRENCY env var, or 8.
+        """
         super().__init__(model=model)
         self.base_url = base_url
+        # Requests go to the loopback-pinned URL, the public base_url stays as given
+        self._chat_url = f"{_pin_loopback(base_url)}/chat"
         self.enable_thinking = enable_thinking
+        self.timeout = timeout
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "8"))
+        self.max_concurrency = max_concurrency
+        # Ollama is a single host, so the pool never needs more connections than requests in flight
+        self.backend = backend if backend is not None else AiohttpBackend(
+            timeout=timeout,
+            limit=max_concurrency,
+            limit_per_host=max_concurrency,
+        )
+        # Caps the number of requests in flight to the Ollama server, see _admission
+        self._admission_semaphore: Optional[asyncio.Semaphore] = None
+        self._admission_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Keys shared by every request of this provider, copied into each payload
+        self._payload_template = {"model": self.model, "stream": False}
+        # The template serialized once, without its closing brace, to prefix every request body
+        self._payload_prefix = json_dumps(self._payload_template)[:-1]
+        # Pending cacheable requests by cache key, so identical concurrent calls share one request
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def _admission(self) -> asyncio.Semaphore:
+        """
+        Semaphore capping the number of requests in flight to the Ollama server.
+
+        A semaphore is bound to the event loop it is first awaited on, so a new one
+        is created whenever the provider is used from another loop, e.g. a later asyncio.run().
+        """
+        loop = asyncio.get_running_loop()
+        if self._admission_loop is not loop:
+            self._admission_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._admission_loop = loop
+        return self._admission_semaphore
+
+    async def __aenter__(self):
+        """Async context manager entry"""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit"""
+        await self.disconnect()
+
+    async def connect(self) -> None:
+        """
+        Open the HTTP client shared by all calls to the Ollama API.
+
+        Keeping a single client alive lets consecutive calls reuse pooled
+        keep-alive connections instead of reconnecting on every request.
+        """
+        await self.backend.connect()
+
+    async def disconnect(self) -> None:
+        """Close the shared HTTP client"""
+        await self.backend.aclose()
+
+    async def aclose(self) -> None:
+        """Alias of disconnect(), following the usual async client naming"""
+        await self.disconnect()
 
     async def call(
         self,
         messages: List[Message],
         temperature: float = 1,
         max_tokens: Optional[int] = None,
+        cache: Optional[bool] = None,
         **kwargs
     ) -> LLMResponse:
         """
@@ -31,21 +161,241 @@ class OllamaProvider(BaseLLMProvider):
             messages: List of Message objects
             temperature: Temperature for sampling
             max_tokens: Maximum number of tokens to generate
+            cache: Whether to serve and store the response in the response cache,
+                and share it with identical calls that are already in flight.
+                Defaults to caching only deterministic calls, whose effective temperature
+                (including any `options` override) is 0.
             **kwargs: Additional arguments to pass to the API
             
         Returns:
             LLMResponse object with the response content
         """
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
+        formatted_messages = payload["messages"]
+
+        if cache is None:
+            # options={"temperature": ...} overrides the argument, so check what is actually sent
+            cache = payload["options"].get("temperature") == 0
+
+        # Serialize once; the same body is hashed for the cache key and sent to the API
+        body = self._serialize_payload(payload)
+
+        if not cache:
+            return await self._fetch(body, formatted_messages)
+
+        cache_key = ResponseCache.make_key_from_body(body)
+        cached_response = await self.response_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        # Join an identical request that is already in flight instead of sending it again.
+        # The request is shielded so that a cancelled caller doesn't cancel it for the others
+        request = self._inflight.get(cache_key)
+        if request is None:
+            request = asyncio.ensure_future(self._fetch(body, formatted_messages, cache_key))
+            self._inflight[cache_key] = request
+            request.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+
+        return await asyncio.shield(request)
+
+    async def _fetch(
+        self,
+        body: bytes,
+        formatted_messages: List[Dict[str, Any]],
+        cache_key: Optional[str] = None
+    ) -> LLMResponse:
+        """Send a serialized request and build the LLMResponse, storing it under cache_key if given"""
+        # Make the API call
+        response_json, content = await self._chat(body)
+
+        # Ollama reports exact token counts in the final response (or final stream chunk).
+        # Fall back to a whitespace approximation if they are missing, e.g. on a cached prompt
+        prompt_tokens = response_json.get("prompt_eval_count")
+        if prompt_tokens is None:
+            prompt_tokens = sum(len(msg.get("content", "").split()) for msg in formatted_messages)
+        completion_tokens = response_json.get("eval_count")
+        if completion_tokens is None:
+            completion_tokens = len(content.split())
+        
+        # Create and return the LLMResponse
+        llm_response = LLMResponse(
+            content=content,
+            raw_response=response_json,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        )
+
+        if cache_key is not None:
+            await self.response_cache.set(cache_key, llm_response)
+
+        return llm_response
+
+    async def call_many(
+        self,
+        batch: List[List[Message]],
+        concurrency: Optional[int] = None,
+        **kwargs
+    ) -> List[LLMResponse]:
+        """
+        Call the Ollama API for several conversations concurrently.
+        
+        Requests share the provider's connection pool, and at most `concurrency`
+        of them are in flight at once.
+        
+        Args:
+            batch: List of conversations, each a list of Message objects
+            concurrency: Maximum number of concurrent requests. Defaults to the
+                provider's max_concurrency; higher values have no effect.
+            **kwargs: Additional arguments passed to each call
+            
+        Returns:
+            List of LLMResponse objects, in the same order as the batch
+
+        Raises:
+            The first error of any call, after the other calls are cancelled
+        """
+        semaphore = asyncio.Semaphore(concurrency if concurrency is not None else self.max_concurrency)
+
+        async def call_one(messages: List[Message]) -> LLMResponse:
+            async with semaphore:
+                return await self.call(messages, **kwargs)
+
+        await self.connect()
+        tasks = [asyncio.ensure_future(call_one(messages)) for messages in batch]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave the rest of the batch running once the caller has seen the error
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    @retry(
+        retry=retry_if_exception(_is_retryable_error),
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=0.25, max=8),
+        reraise=True,
+    )
+    async def _chat(self, body: bytes) -> Tuple[Dict[str, Any], str]:
+        """
+        Send a chat request to Ollama and read back the full response.
+        
+        Each attempt waits for an admission slot, so requests retried while
+        the server is overloaded queue up behind the ones already in flight.
+        The body is serialized by the caller, so retries only redo the I/O.
+        
+        Args:
+            body: The serialized request payload
+            
+        Returns:
+            A tuple of the final response JSON and the response content
+        """
+        try:
+            async with self._admission:
+                response = await self.backend.post(self._chat_url, body, self._JSON_HEADERS)
+        except HTTPStatusError as e:
+            raise OllamaAPIError(e.status, e.text) from e
+            
+        # The payload sets "stream": false, so Ollama answers with a single JSON object.
+        # NDJSON is only handled as a fallback for servers that stream regardless
+        if 'application/x-ndjson' in response.content_type:
+            # Handle streaming response
+            parts: List[str] = []
+            response_json = {}
+            for line in response.body.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    chunk_json = json_loads(line.strip())
+                    if 'message' in chunk_json and 'content' in chunk_json['message']:
+                        parts.append(chunk_json['message']['content'])
+                    response_json = chunk_json  # Keep the last chunk for metadata
+                except Exception as e:
+                    print(f"Error parsing chunk: {e}")
+            content = "".join(parts)
+        else:
+            # Handle regular JSON response
+            response_json = json_loads(response.body)
+            content = response_json.get("message", {}).get("content", "")
+
+        return response_json, content
+
+    async def astream(
+        self,
+        messages: List[Message],
+        temperature: float = 1,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response of the Ollama API for the given messages.
+        
+        Content deltas are yielded as soon as Ollama emits them, so callers can
+        start acting on the output before the whole completion is generated.
+        
+        Args:
+            messages: List of Message objects
+            temperature: Temperature for sampling
+            max_tokens: Maximum number of tokens to generate
+            **kwargs: Additional arguments to pass to the API
+            
+        Yields:
+            Chunks of the response content
+
+        Raises:
+            OllamaAPIError: If Ollama rejects the request or fails while generating
+        """
+        payload = self._build_payload(messages, temperature, max_tokens, **kwargs)
+        payload["stream"] = True
+
+        try:
+            async with self._admission:
+                async for line in self.backend.stream(self._chat_url, json_dumps(payload), self._JSON_HEADERS):
+                    if not line.strip():
+                        continue
+                    chunk_json = json_loads(line)
+                    # Ollama reports failures during generation as an error chunk in the 200 response
+                    if "error" in chunk_json:
+                        raise OllamaAPIError(200, chunk_json["error"])
+                    delta = chunk_json.get("message", {}).get("content")
+                    if delta:
+                        yield delta
+        except OllamaAPIError:
+            raise
+        except HTTPStatusError as e:
+            raise OllamaAPIError(e.status, e.text) from e
+
+    def _build_payload(
+        self,
+        messages: List[Message],
+        temperature: float,
+        max_tokens: Optional[int],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Build the request payload for the Ollama chat endpoint.
+        
+        Args:
+            messages: List of Message objects
+            temperature: Temperature for sampling
+            max_tokens: Maximum number of tokens to generate
+            **kwargs: Additional arguments to pass to the API
+            
+        Returns:
+            The request payload
+        """
         # Convert messages to Ollama format
         formatted_messages = self._format_messages(messages)
         
         # Prepare the request payload
-        payload = {
-            "model": self.model,
-            "messages": formatted_messages,
-            "options": {
-                "temperature": temperature,
-            }
+        payload = self._payload_template.copy()
+        payload["messages"] = formatted_messages
+        payload["options"] = {
+            "temperature": temperature,
         }
         
         # Add max_tokens if specified
@@ -55,53 +405,38 @@ class OllamaProvider(BaseLLMProvider):
         # Add any additional options from kwargs
         if "options" in kwargs:
             payload["options"].update(kwargs["options"])
+
+        return payload
+        
+    def _serialize_payload(self, payload: Dict[str, Any]) -> bytes:
+        """
+        Serialize a payload built by _build_payload to a JSON request body.
+        
+        The template keys are serialized once in __init__, so for the usual
+        payload only the messages and options are encoded on each call.
+        
+        Args:
+            payload: The request payload
             
-        # Make the API call
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{self.base_url}/chat", json=payload, params={"stream": "false"}) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Ollama API error: {response.status} - {error_text}")
-                
-                # Handle both streaming and non-streaming responses
-                content_type = response.headers.get('Content-Type', '')
-                if 'application/x-ndjson' in content_type:
-                    # Handle streaming response
-                    full_response = ""
-                    response_json = {}
-                    async for line in response.content:
-                        if not line.strip():
-                            continue
-                        try:
-                            chunk = line.decode('utf-8').strip()
-                            chunk_json = json.loads(chunk)
-                            if 'message' in chunk_json and 'content' in chunk_json['message']:
-                                full_response += chunk_json['message']['content']
-                            response_json = chunk_json  # Keep the last chunk for metadata
-                        except Exception as e:
-                            print(f"Error parsing chunk: {e}")
-                    content = full_response
-                else:
-                    # Handle regular JSON response
-                    response_json = await response.json()
-                    content = response_json.get("message", {}).get("content", "")
-        
-        # Calculate token usage (Ollama doesn't provide this directly)
-        # This is an approximation
-        prompt_tokens = sum(len(msg.get("content", "").split()) for msg in formatted_messages)
-        completion_tokens = len(content.split())
+        Returns:
+            The JSON encoded payload
+        """
+        template = self._payload_template
+        if (
+            len(payload) != len(template) + 2
+            or any(payload.get(key) != value for key, value in template.items())
+        ):
+            return json_dumps(payload)
+
+        return b"".join((
+            self._payload_prefix,
+            b',"messages":',
+            json_dumps(payload["messages"]),
+            b',"options":',
+            json_dumps(payload["options"]),
+            b"}",
+        ))
         
-        # Create and return the LLMResponse
-        return LLMResponse(
-            content=content,
-            raw_response=response_json,
-            usage={
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens
-            }
-        )
-    
     def _format_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
         """
         Format messages for the Ollama API.
@@ -112,32 +447,5 @@ class OllamaProvider(BaseLLMProvider):
         Returns:
             List of formatted messages for Ollama API
         """
-        formatted_messages = []
-        
-        for message in messages:
-            # Skip state messages
-            if message.is_state_message:
-                continue
-                
-            # Extract content
-            content = ""
-            if isinstance(message.content, str):
-                content = message.content
-            elif isinstance(message.content, list):
-                # For now, we only support text content
-                for content_block in message.content:
-                    if hasattr(content_block, "text"):
-                        content += content_block.text
-            
-            # Map role (Ollama uses system/user/assistant)
-            role = message.role
-            if role not in ["system", "user", "assistant"]:
-                # Default to user for other roles
-                role = "user"
-                
-            formatted_messages.append({
-                "role": role,
-                "content": content
-            })
-            
-        return formatted_messages
+        # Skip state messages
+        return [message.to_ollama_format() for message in messages if not message.is_state_message]
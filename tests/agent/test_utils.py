@@ -6,7 +6,12 @@ from index.agent.models import (  # Assuming ActionModel is part of AgentLLMOutp
     ActionModel,
     AgentLLMOutput,
 )
-from index.agent.utils import generate_proper_json, validate_json
+from index.agent.utils import (
+    _extract_json_candidate_cached,
+    find_first_json_object,
+    generate_proper_json,
+    validate_json,
+)
 from index.llm.llm import (  # Assuming LLMResponse is the type returned by llm.call
     BaseLLMProvider,
     LLMResponse,
@@ -120,6 +125,83 @@ async def test_validate_json_needs_cleaning_control_chars():
     assert result.summary == expected_output.summary
     assert len(mock_llm.call_history) == 0
 
+@pytest.mark.asyncio
+async def test_validate_json_plain_json_surrounded_by_prose():
+    raw_response = "Sure, here is my next step:\n{\"action\": {\"name\": \"scroll\", \"params\": {\"direction\": \"up\"}}, \"thought\": \"Need the {header}\", \"summary\": \"Scrolled up\"}\nLet me know if you need anything else."
+    mock_llm = MockLLMProvider()
+
+    result = await validate_json(raw_response, mock_llm)
+
+    assert result.action == ActionModel(name="scroll", params={"direction": "up"})
+    assert result.thought == "Need the {header}"
+    assert result.summary == "Scrolled up"
+    assert len(mock_llm.call_history) == 0 # Prose is stripped without asking the LLM to fix it
+
+@pytest.mark.asyncio
+async def test_validate_json_plain_json_after_prose_with_braces():
+    raw_response = "Clicking element {5} now. {\"action\": {\"name\": \"click_element\", \"params\": {\"index\": 5}}, \"thought\": \"Click it\", \"summary\": \"Clicked element 5\"}"
+    mock_llm = MockLLMProvider()
+
+    result = await validate_json(raw_response, mock_llm)
+
+    assert result.action == ActionModel(name="click_element", params={"index": 5})
+    assert result.summary == "Clicked element 5"
+    assert len(mock_llm.call_history) == 0
+
+@pytest.mark.asyncio
+async def test_validate_json_plain_json_after_prose_with_json_fragment():
+    raw_response = "I will call click_element with {\"index\": 5}.\n{\"thought\": \"Click it\", \"action\": {\"name\": \"click_element\", \"params\": {\"index\": 5}}, \"summary\": \"Clicked element 5\"}"
+    mock_llm = MockLLMProvider()
+
+    result = await validate_json(raw_response, mock_llm)
+
+    assert result.action == ActionModel(name="click_element", params={"index": 5})
+    assert result.thought == "Click it"
+    assert len(mock_llm.call_history) == 0
+
+@pytest.mark.asyncio
+async def test_validate_json_plain_json_after_unclosed_brace_in_prose():
+    raw_response = "a { opens here. {\"thought\": \"Scroll\", \"action\": {\"name\": \"scroll\", \"params\": {\"direction\": \"down\"}}, \"summary\": \"Scrolled down\"}"
+    mock_llm = MockLLMProvider()
+
+    result = await validate_json(raw_response, mock_llm)
+
+    assert result.action == ActionModel(name="scroll", params={"direction": "down"})
+    assert result.summary == "Scrolled down"
+    assert len(mock_llm.call_history) == 0
+
+@pytest.mark.asyncio
+async def test_validate_json_large_response():
+    long_thought = "x" * 64 * 1024 # Large enough to be extracted in a worker thread
+    _extract_json_candidate_cached.cache_clear()
+    raw_response = f"<output>{{\"action\": {{\"name\": \"done\", \"params\": {{}}}}, \"thought\": \"{long_thought}\", \"summary\": \"Done\"}}</output>"
+    mock_llm = MockLLMProvider()
+
+    result = await validate_json(raw_response, mock_llm)
+
+    assert result.thought == long_thought
+    assert result.summary == "Done"
+    assert len(mock_llm.call_history) == 0
+    assert _extract_json_candidate_cached.cache_info().currsize == 0 # Large responses aren't memoized
+
+# --- Tests for find_first_json_object ---
+
+def test_find_first_json_object_ignores_braces_in_strings():
+    text = 'prefix {"a": "}{", "b": {"c": "\\"}"}} suffix {"d": 1}'
+
+    assert find_first_json_object(text) == '{"a": "}{", "b": {"c": "\\"}"}}'
+
+def test_find_first_json_object_skips_braces_in_prose():
+    text = 'Clicking element {5} now. {"thought": "Click {5}", "summary": "Clicked"}'
+
+    assert find_first_json_object(text) == '{"thought": "Click {5}", "summary": "Clicked"}'
+    assert find_first_json_object("Set {x} to {y}") is None
+
+def test_find_first_json_object_skips_braces_that_never_close():
+    assert find_first_json_object("no json here") is None
+    assert find_first_json_object('a { opens here. {"b": 1}') == '{"b": 1}'
+    assert find_first_json_object('{"a": {"b": 1') is None
+
 # --- Tests for generate_proper_json (can be simple, as it's a direct LLM call) ---
 @pytest.mark.asyncio
 async def test_generate_proper_json_calls_llm_and_strips():
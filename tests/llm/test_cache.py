@@ -0,0 +1,51 @@
+# Test cases for the LLM response cache
+
+import pytest
+
+from index.llm.cache import ResponseCache
+from index.llm.llm import LLMResponse
+
+
+def make_response(content: str) -> LLMResponse:
+    return LLMResponse(content=content, raw_response=None, usage={"prompt_tokens": 1, "completion_tokens": 1})
+
+
+def test_make_key_from_body_depends_only_on_the_body():
+    key = ResponseCache.make_key_from_body(b'{"model":"llama3.2","options":{"temperature":0}}')
+
+    assert key == ResponseCache.make_key_from_body(b'{"model":"llama3.2","options":{"temperature":0}}')
+    assert key != ResponseCache.make_key_from_body(b'{"model":"llama3.2","options":{"temperature":1}}')
+
+
+@pytest.mark.asyncio
+async def test_get_returns_stored_response():
+    cache = ResponseCache()
+    response = make_response("hello")
+
+    assert await cache.get("key") is None
+    await cache.set("key", response)
+    assert await cache.get("key") is response
+
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_entry():
+    cache = ResponseCache(maxsize=2)
+    await cache.set("a", make_response("a"))
+    await cache.set("b", make_response("b"))
+
+    # Touch "a" so that "b" becomes the least recently used entry
+    await cache.get("a")
+    await cache.set("c", make_response("c"))
+
+    assert len(cache) == 2
+    assert await cache.get("b") is None
+    assert (await cache.get("a")).content == "a"
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_dropped():
+    cache = ResponseCache(ttl=-1)
+    await cache.set("key", make_response("stale"))
+
+    assert await cache.get("key") is None
+    assert len(cache) == 0
@@ -0,0 +1,72 @@
+# Test cases for the HTTP backend helpers
+
+import asyncio
+import importlib.util
+
+import aiohttp
+import pytest
+
+from index.llm.http import (
+    AiohttpBackend,
+    HTTPConnectionError,
+    HttpxBackend,
+    HTTPTimeoutError,
+    _iter_lines,
+)
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_splits_across_chunk_boundaries():
+    lines = [line async for line in _iter_lines(_chunks(b'{"a"', b':1}\n{"b":2}\n\n{"c"', b":3}\n"))]
+
+    assert lines == [b'{"a":1}', b'{"b":2}', b"", b'{"c":3}']
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_flushes_unterminated_last_line():
+    lines = [line async for line in _iter_lines(_chunks(b"first\nsec", b"ond"))]
+
+    assert lines == [b"first", b"second"]
+
+
+def test_httpx_backend_enables_http2_when_h2_is_installed():
+    pytest.importorskip("httpx")
+
+    assert HttpxBackend().http2 == (importlib.util.find_spec("h2") is not None)
+    assert HttpxBackend(http2=False).http2 is False
+
+
+def test_aiohttp_backend_reopens_session_on_a_new_event_loop():
+    backend = AiohttpBackend()
+
+    async def open_session():
+        await backend.connect()
+        return backend._session
+
+    first = asyncio.run(open_session())
+
+    async def reopen_and_close():
+        second = await open_session()
+        await backend.aclose()
+        return second
+
+    second = asyncio.run(reopen_and_close())
+
+    assert second is not first
+    assert second.closed
+    assert backend._session is None
+
+
+def test_aiohttp_backend_translates_client_errors():
+    with pytest.raises(HTTPTimeoutError):
+        with AiohttpBackend._translate_errors():
+            raise asyncio.TimeoutError()
+
+    with pytest.raises(HTTPConnectionError):
+        with AiohttpBackend._translate_errors():
+            raise aiohttp.ServerDisconnectedError()